@@ -22,12 +22,14 @@ class TranscriptCollector:
 
     def reset(self):
         self.transcript_parts = []
+        self._joined = ""
 
     def add_part(self, part):
         self.transcript_parts.append(part)
+        self._joined = self._joined + ' ' + part if self._joined else part
 
     def get_full_transcript(self):
-        return ' '.join(self.transcript_parts)
+        return self._joined
 
 transcript_collector = TranscriptCollector()
 
@@ -1,9 +1,10 @@
 import os
+import atexit
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 import subprocess
 import shutil
-import time
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import DG_API_KEY
@@ -14,19 +15,53 @@ load_dotenv()
 if not DG_API_KEY:
     raise ValueError("DG_API_KEY environment variable is not set")
 
+SAMPLE_RATE = 24000
+
+# Raw PCM rather than WAV so consecutive responses can share one player
+DEEPGRAM_URL = f"https://api.deepgram.com/v1/speak?encoding=linear16&container=none&sample_rate={SAMPLE_RATE}"
+
+# Shared keep-alive session so repeated requests reuse the same TLS connection
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4))
+_HTTP.headers.update({
+    "Authorization": f"Token {DG_API_KEY}",
+    "Content-Type": "application/json"
+})
+
+# Long-running ffplay process fed by every call, started on first use
+_player_process = None
+
 def is_installed(lib_name: str) -> bool:
     lib = shutil.which(lib_name)
     return lib is not None
 
+def get_player():
+    """Return the shared ffplay process, starting it if it isn't running."""
+    global _player_process
+    if _player_process is None or _player_process.poll() is not None:
+        _player_process = subprocess.Popen(
+            ["ffplay", "-autoexit", "-nodisp", "-f", "s16le", "-ar", str(SAMPLE_RATE), "-i", "pipe:0"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    return _player_process
+
+def close_player():
+    """Let the shared player finish what it has buffered, then stop it."""
+    global _player_process
+    if _player_process is not None:
+        _player_process.stdin.close()
+        _player_process.wait()
+        _player_process = None
+
+@atexit.register
+def _terminate_player():
+    if _player_process is not None:
+        _player_process.terminate()
+
 def save_and_play_audio(text):
-    """Send a TTS request to Deepgram, save the response, and play it with ffplay."""
-    DEEPGRAM_URL = "https://api.deepgram.com/v1/speak"
-    
-    headers = {
-        "Authorization": f"Token {DG_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    
+    """Send a TTS request to Deepgram and stream the audio into the shared ffplay player."""
     # Using the simplest possible payload
     payload = {
         "text": text
@@ -34,29 +69,23 @@ def save_and_play_audio(text):
 
     if not is_installed("ffplay"):
         raise ValueError("ffplay not found. Ensure FFmpeg is installed and ffplay is in your PATH.")
-
-    # File to save audio for debugging
-    output_file = "output.wav"
     
     print(f"Sending request to {DEEPGRAM_URL} with text: '{text}'")
     
     try:
         # Send POST request to Deepgram
-        response = requests.post(DEEPGRAM_URL, headers=headers, json=payload)
-        
-        if response.status_code != 200:
-            print(f"Deepgram API error: {response.status_code} - {response.text}")
-            return False
-        
-        # Save the audio response to a file
-        with open(output_file, "wb") as f:
-            f.write(response.content)
-        
-        print(f"Audio saved to {output_file}")
-        
-        # Play the audio file
-        print("Playing audio...")
-        subprocess.run(["ffplay", "-autoexit", "-nodisp", output_file])
+        with _HTTP.post(DEEPGRAM_URL, json=payload, stream=True, timeout=10.0) as response:
+            if response.status_code != 200:
+                print(f"Deepgram API error: {response.status_code} - {response.text}")
+                return False
+
+            # Play the audio as it arrives
+            print("Playing audio...")
+            player_process = get_player()
+            for chunk in response.iter_content(chunk_size=4096):
+                if chunk:
+                    player_process.stdin.write(chunk)
+            player_process.stdin.flush()
         
         return True
     
@@ -68,4 +97,4 @@ def save_and_play_audio(text):
 if __name__ == "__main__":
     text = "Hello, this is a test of Deepgram text-to-speech."
     success = save_and_play_audio(text)
-
+    close_player()
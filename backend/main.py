@@ -3,17 +3,32 @@ Main application module for the conversational customer service agent.
 This ties together speech-to-text, LLM, and text-to-speech components.
 """
 import asyncio
+import difflib
 import os
+import re
 import shutil
 import subprocess
+import json
 import time
-import requests
+import numpy as np
+import websockets
 from dotenv import load_dotenv
 
-# Updated imports for LangChain to avoid deprecation warnings
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import SystemMessage, HumanMessage
-from langchain_groq import ChatGroq
+from groq import AsyncGroq
+
+# Optional local embedding model for the semantic response cache
+try:
+    from fastembed import TextEmbedding
+except ImportError:
+    TextEmbedding = None
+
+# Optional local speech recognition, used when STT_BACKEND=local
+try:
+    import sounddevice
+    import webrtcvad
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
 
 # Import the correct Deepgram modules
 from deepgram import (
@@ -29,6 +44,13 @@ from deepgram import (
 # Load environment variables
 load_dotenv()
 
+# Splits streamed LLM output after sentence-ending punctuation
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+# Responses mentioning account-specific details (account/phone numbers,
+# amounts) are never cached
+DYNAMIC_CONTENT = re.compile(r"\d{4,}|[$€£]\s?\d")
+
 class TranscriptCollector:
     def __init__(self):
         self.reset()
@@ -36,14 +58,220 @@ class TranscriptCollector:
     def reset(self):
         """Reset transcript parts collection."""
         self.transcript_parts = []
+        self._joined = ""
 
     def add_part(self, part):
         """Add a part to the transcript."""
         self.transcript_parts.append(part)
+        # Keep the joined transcript up to date so reads don't rejoin every part
+        self._joined = self._joined + ' ' + part if self._joined else part
 
     def get_full_transcript(self):
         """Get the full transcript from all parts."""
-        return ' '.join(self.transcript_parts)
+        return self._joined
+
+# Static system prompt. It always leads the message list, with chat history
+# and the new utterance strictly after it, so every request shares the same
+# prefix and the provider's prompt cache can skip re-prefilling it.
+SYSTEM_PROMPT = """You are a helpful and friendly customer service assistant for a cell phone provider.
+Your goal is to help customers with issues like:
+- Billing questions
+- Troubleshooting their mobile devices
+- Explaining data plans and features
+- Activating or deactivating services
+- Transferring them to appropriate departments for further assistance
+Maintain a polite and professional tone in your responses. Always make the customer feel valued and heard.
+Keep your responses concise as they will be spoken aloud."""
+
+# Built once and shared by every request rather than rebuilt per turn
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Frequent requests answered with a canned response, bypassing the LLM.
+# All patterns are combined into one regex so an utterance is scanned once.
+# Keywords may be only a few words apart so unrelated phrases don't match.
+INTENT_ROUTES = [
+    ("pay_bill", r"\b(?:pay|settle)(?:\W+\w+){0,2}?\W+bill\b",
+     "You can pay your bill in the app under Billing, or from your account page on our website. Is there anything else I can help with?"),
+    ("check_balance", r"\b(?:check|what'?s|what is|know)(?:\W+\w+){0,2}?\W+(?:balance|bill amount)\b(?!\W+transfer)",
+     "Your current balance and due date are shown in the app under Billing. Is there anything else I can help with?"),
+    ("reset_password", r"\b(?:reset|forgot)(?:\W+\w+){0,2}?\W+password\b",
+     "You can reset your password from the sign-in page by selecting Forgot password and following the steps there. Is there anything else I can help with?"),
+    ("speak_to_agent", r"\b(?:speak|talk)\W+(?:to|with)(?:\W+\w+){0,2}?\W+(?:agent|human|person|representative)\b",
+     "You can reach one of our customer service representatives from the Contact us page in the app. In the meantime, tell me what you need and I'll do my best to help."),
+    ("data_usage", r"\b(?:how much|check)(?:\W+\w+){0,2}?\W+data(?:\W+\w+){0,3}?\W+(?:left|used|usage|remaining)\b",
+     "You can see your remaining data in the app on the Usage page. Would you like to hear about plans with more data?"),
+    ("store_hours", r"\b(?:store|shop)(?:\W+\w+){0,2}?\W+(?:hours|open|close)\b",
+     "Most of our stores are open from 9 AM to 9 PM, Monday through Saturday. Would you like help finding the store nearest to you?"),
+]
+INTENT_PATTERN = re.compile(
+    "|".join(f"(?P<{name}>{pattern})" for name, pattern, _ in INTENT_ROUTES),
+    re.IGNORECASE,
+)
+INTENT_RESPONSES = {name: response for name, _, response in INTENT_ROUTES}
+
+# Negations and problem reports change what a request means ("I don't want
+# to talk to a human", "why can't I pay my bill"), so these go to the LLM.
+# Transcripts don't always keep the apostrophe, so bare forms are listed too.
+INTENT_BLOCKERS = re.compile(
+    r"\b(?:not|no|never|cannot|\w+n['’]t|dont|cant|wont|didnt|doesnt|isnt|wasnt|arent|shouldnt|couldnt|wouldnt"
+    r"|why|fail\w*|error|problem|issue|wrong|broken|unable)\b",
+    re.IGNORECASE,
+)
+INTENT_MAX_WORDS = 15
+
+def route_intent(text):
+    """Return the canned response for a short, unambiguous request, or None."""
+    text = text.strip()
+    if len(text.split()) > INTENT_MAX_WORDS or SENTENCE_BOUNDARY.search(text):
+        return None
+    if INTENT_BLOCKERS.search(text):
+        return None
+    match = INTENT_PATTERN.search(text)
+    if match is None:
+        return None
+    return INTENT_RESPONSES[match.lastgroup]
+
+# Once the history grows past HISTORY_SUMMARY_THRESHOLD messages, all but the
+# last HISTORY_KEEP_RECENT are replaced by a summary from a faster model
+HISTORY_SUMMARY_THRESHOLD = 12
+HISTORY_KEEP_RECENT = 8
+SUMMARY_MODEL = "llama3-8b-8192"
+SUMMARY_PROMPT = """Summarize this conversation between a customer and a cell phone provider's assistant in a few sentences.
+Keep every fact the assistant may need later: the customer's issue, details they gave, and what has already been tried or promised."""
+
+def cached_prompt_tokens(usage):
+    """Return the number of prompt tokens the provider served from its cache, if reported."""
+    details = usage.get("prompt_tokens_details") or usage.get("input_token_details") or {}
+    return details.get("cached_tokens", details.get("cache_read"))
+
+class ResponseCache:
+    def __init__(self, threshold=0.92, max_entries=256, min_words=3):
+        """
+        Two-tier cache of LLM responses keyed by user utterance and the
+        assistant reply it follows.
+
+        Exact (normalized) matches are looked up in a dict. Otherwise, if
+        fastembed is installed, the utterance is embedded and compared by
+        cosine similarity against cached prompts that followed the same
+        assistant reply. Keying on that reply keeps follow-ups like "yes"
+        from being replayed in an unrelated context.
+
+        Args:
+            threshold: Minimum cosine similarity for a semantic hit
+            max_entries: Number of entries kept before the oldest are evicted
+            min_words: Utterances with fewer words are never cached
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.min_words = min_words
+        self._exact = {}
+        self._prompts = []
+        self._responses = []
+        self._embeddings = None
+        self._embedder = None
+        if TextEmbedding is not None:
+            try:
+                self._embedder = TextEmbedding("sentence-transformers/all-MiniLM-L6-v2")
+            except Exception as e:
+                print(f"Semantic cache disabled, could not load embedding model: {e}")
+
+    @staticmethod
+    def _key(text, context):
+        """Normalize an utterance and its preceding assistant reply for exact matching."""
+        return context.lower().strip(), text.lower().strip()
+
+    def _embed(self, text):
+        """Return the unit-length embedding of an utterance."""
+        vector = next(iter(self._embedder.embed([text])))
+        return vector / np.linalg.norm(vector)
+
+    def _cacheable(self, text):
+        """Check whether an utterance is specific enough to answer from cache."""
+        return len(text.split()) >= self.min_words
+
+    def get(self, text, context=""):
+        """
+        Return the cached response for an utterance, or None on a miss.
+
+        Args:
+            text: User utterance
+            context: Assistant reply the utterance answers ("" at the start)
+        """
+        if not self._cacheable(text):
+            return None
+
+        key = self._key(text, context)
+        if key in self._exact:
+            return self._exact[key]
+
+        if self._embedder is None:
+            return None
+
+        # Only prompts that followed the same assistant reply are comparable
+        candidates = [index for index, (prompt_context, _) in enumerate(self._prompts) if prompt_context == key[0]]
+        if not candidates:
+            return None
+
+        similarities = self._embeddings[candidates] @ self._embed(key[1])
+        best = int(np.argmax(similarities))
+        if similarities[best] > self.threshold:
+            return self._responses[candidates[best]]
+        return None
+
+    def put(self, text, response, context=""):
+        """Cache a response unless it contains account-specific details."""
+        if not self._cacheable(text):
+            return
+        if DYNAMIC_CONTENT.search(text) or DYNAMIC_CONTENT.search(response):
+            return
+
+        key = self._key(text, context)
+        if key in self._exact:
+            return
+
+        if len(self._exact) >= self.max_entries:
+            oldest = next(iter(self._exact))
+            del self._exact[oldest]
+            if oldest in self._prompts:
+                index = self._prompts.index(oldest)
+                del self._prompts[index]
+                del self._responses[index]
+                self._embeddings = np.delete(self._embeddings, index, axis=0)
+        self._exact[key] = response
+
+        if self._embedder is not None:
+            embedding = self._embed(key[1])[np.newaxis, :]
+            self._prompts.append(key)
+            self._responses.append(response)
+            if self._embeddings is None or not len(self._embeddings):
+                self._embeddings = embedding
+            else:
+                self._embeddings = np.vstack([self._embeddings, embedding])
+
+class SpeculativeResponse:
+    def __init__(self, text, generate, threshold=0.9):
+        """
+        LLM response generated in the background for a transcript that may
+        still change, so prefill overlaps the tail of speech recognition.
+
+        Args:
+            text: Transcript the response is generated for
+            generate: Coroutine function streaming sentences into a queue
+            threshold: Minimum similarity for a final transcript to reuse it
+        """
+        self.text = text
+        self.threshold = threshold
+        self.sentences = asyncio.Queue()
+        self.task = asyncio.create_task(generate(text, self.sentences))
+
+    def matches(self, text):
+        """Check whether ``text`` is close enough to reuse this response."""
+        ratio = difflib.SequenceMatcher(None, self.text.lower(), text.lower()).ratio()
+        return ratio > self.threshold
+
+    def cancel(self):
+        """Abandon the background generation."""
+        self.task.cancel()
 
 class LanguageModelProcessor:
     def __init__(self):
@@ -56,86 +284,244 @@ class LanguageModelProcessor:
         if not groq_api_key:
             raise ValueError("GROQ_API_KEY environment variable not found. Please set it in your .env file.")
             
-        # Initialize LLM
-        self.llm = ChatGroq(
-            temperature=0, 
-            model_name="llama3-70b-8192", 
-            groq_api_key=groq_api_key
-        )
+        # Initialize the Groq client; requests are built directly, without a
+        # prompt template, since the message shape never changes
+        self.client = AsyncGroq(api_key=groq_api_key)
+        self.model_name = "llama3-70b-8192"
 
-        # System prompt for customer service
-        self.system_prompt = """  
-        You are a helpful and friendly customer service assistant for a cell phone provider.  
-        Your goal is to help customers with issues like:
-        - Billing questions
-        - Troubleshooting their mobile devices
-        - Explaining data plans and features
-        - Activating or deactivating services
-        - Transferring them to appropriate departments for further assistance
-        Maintain a polite and professional tone in your responses. Always make the customer feel valued and heard.
-        Keep your responses concise as they will be spoken aloud.
-        """
+        # System prompt message for customer service. Kept byte-identical
+        # across turns so the provider can serve it from its prompt cache.
+        self.system_message = SYSTEM_MESSAGE
         
-        # Create the chat history
+        # Create the chat history of {"role", "content"} messages
         self.chat_history = []
-        
-        # Create the prompt template (avoiding deprecated classes)
-        self.prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "{text}")
-        ])
-
-    def process(self, text):
+
+        # Responses to previously seen utterances
+        self.cache = ResponseCache()
+
+        # Background summarization of older chat history, if one is running
+        self._summary_task = None
+
+    async def _generate(self, text, sentences):
+        """
+        Stream the LLM response to ``text`` into the ``sentences`` queue.
+
+        Each complete sentence is queued as soon as it arrives, followed by
+        ``None`` once generation ends. Chat history is left untouched so a
+        generation can be discarded.
+
+        Returns:
+            Tuple of the full response text and the usage reported by Groq
+        """
+        # Measure response time
+        start_time = time.time()
+        first_sentence_time = None
+
+        try:
+            # The new utterance is only added to the history once answered, so
+            # it appears once, after the static system prompt and history
+            messages = [
+                self.system_message,
+                *self.chat_history,
+                {"role": "user", "content": text},
+            ]
+
+            # Stream the completion, flushing complete sentences as they arrive
+            stream = await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=0,
+                stream=True,
+            )
+            usage = {}
+            response_text = ""
+            buffer = ""
+            async for chunk in stream:
+                # Groq reports usage on the final chunk. SDKs without an x_groq
+                # field keep it as the raw dict from the response.
+                x_groq = getattr(chunk, "x_groq", None)
+                if isinstance(x_groq, dict):
+                    chunk_usage = x_groq.get("usage")
+                else:
+                    chunk_usage = getattr(x_groq, "usage", None)
+                if chunk_usage is not None:
+                    usage = chunk_usage if isinstance(chunk_usage, dict) else chunk_usage.model_dump()
+                if not chunk.choices:
+                    continue
+
+                content = chunk.choices[0].delta.content or ""
+                response_text += content
+                buffer += content
+
+                parts = SENTENCE_BOUNDARY.split(buffer)
+                buffer = parts.pop()
+                for sentence in parts:
+                    if first_sentence_time is None:
+                        first_sentence_time = time.time()
+                        ttfs = int((first_sentence_time - start_time) * 1000)
+                        print(f"LLM Time to First Sentence: {ttfs}ms")
+                    sentences.put_nowait(sentence)
+
+            if buffer.strip():
+                sentences.put_nowait(buffer)
+            
+            end_time = time.time()
+            elapsed_time = int((end_time - start_time) * 1000)
+            print(f"LLM ({elapsed_time}ms): {response_text}")
+
+            return response_text, usage
+        finally:
+            sentences.put_nowait(None)
+
+    async def warm(self):
+        """
+        Send a one-token request so the first real turn finds an open
+        connection and the system prompt already in the provider's cache.
+        """
+        try:
+            await self.client.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    self.system_message,
+                    {"role": "user", "content": "."},
+                ],
+                max_tokens=1,
+            )
+        except Exception as e:
+            print(f"Could not warm up LLM connection: {e}")
+
+    def _last_assistant_reply(self):
+        """Return the most recent assistant message, or "" before the first reply."""
+        for message in reversed(self.chat_history):
+            if message["role"] == "assistant":
+                return message["content"]
+        return ""
+
+    def _record_exchange(self, text, response_text):
+        """Add a user/assistant exchange to chat history, compacting it if it grew too long."""
+        self.chat_history.append({"role": "user", "content": text})
+        self.chat_history.append({"role": "assistant", "content": response_text})
+
+        if len(self.chat_history) <= HISTORY_SUMMARY_THRESHOLD:
+            return
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        older = self.chat_history[:-HISTORY_KEEP_RECENT]
+        self._summary_task = asyncio.create_task(self._summarize(older))
+
+    async def _summarize(self, older):
+        """Replace the ``older`` prefix of chat history with a short summary."""
+        transcript = "\n".join(f"{message['role']}: {message['content']}" for message in older)
+        try:
+            completion = await self.client.chat.completions.create(
+                model=SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ],
+                temperature=0,
+                max_tokens=200,
+            )
+        except Exception as e:
+            print(f"Error summarizing chat history: {e}")
+            return
+        summary = completion.choices[0].message.content
+
+        # History only grows at the end, so the summarized messages are still its prefix
+        if self.chat_history[:len(older)] == older:
+            self.chat_history[:len(older)] = [
+                {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+            ]
+            print(f"Summarized {len(older)} earlier messages")
+
+    def speculate(self, text):
+        """Start generating a response to ``text`` in the background."""
+        return SpeculativeResponse(text, self._generate)
+
+    async def process(self, text, on_sentence=None, speculation=None):
         """
         Process user input through the LLM and return the response.
+
+        The response is streamed from the LLM; every completed sentence is
+        awaited on ``on_sentence`` as soon as it arrives so speech can start
+        before generation finishes.
         
         Args:
             text: User input text
+            on_sentence: Optional coroutine function awaited with each complete sentence
+            speculation: Optional SpeculativeResponse started on an interim
+                transcript; reused if it still matches ``text``, cancelled otherwise
             
         Returns:
             LLM response text
         """
+        if speculation is not None and (not text.strip() or not speculation.matches(text)):
+            speculation.cancel()
+            speculation = None
+
         if not text.strip():
-            return "I didn't catch that. Could you please repeat?"
+            response_text = "I didn't catch that. Could you please repeat?"
+            if on_sentence:
+                await on_sentence(response_text)
+            return response_text
             
-        # Add user message to chat history
-        self.chat_history.append(HumanMessage(content=text))
-        
-        # Measure response time
-        start_time = time.time()
+        # Answer common requests and repeated questions without calling the LLM.
+        # Cached replies are keyed on the assistant turn being answered.
+        context = self._last_assistant_reply()
+        cached_response = route_intent(text)
+        if cached_response is None:
+            cached_response = self.cache.get(text, context)
+        if cached_response is not None:
+            if speculation is not None:
+                speculation.cancel()
+            print(f"LLM (cached): {cached_response}")
+            self._record_exchange(text, cached_response)
+            if on_sentence:
+                await on_sentence(cached_response)
+            return cached_response
+
+        if speculation is None:
+            speculation = self.speculate(text)
+        else:
+            print("LLM: reusing speculative response")
         
         try:
-            # Create a runnable chain with the prompt template and LLM
-            chain = self.prompt | self.llm
-            
-            # Process with the chain
-            response = chain.invoke({
-                "text": text,
-                "chat_history": self.chat_history
-            })
-            
-            end_time = time.time()
-            
-            # Extract the text content from the response
-            response_text = response.content
-            
-            # Add AI response to chat history
-            self.chat_history.append(response)
+            while True:
+                sentence = await speculation.sentences.get()
+                if sentence is None:
+                    break
+                if on_sentence:
+                    await on_sentence(sentence)
+
+            response_text, usage = await speculation.task
             
-            elapsed_time = int((end_time - start_time) * 1000)
-            print(f"LLM ({elapsed_time}ms): {response_text}")
+            # Add the exchange to chat history
+            self._record_exchange(text, response_text)
+            self.cache.put(text, response_text, context)
+
+            cached_tokens = cached_prompt_tokens(usage)
+            if cached_tokens is not None:
+                print(f"LLM prompt tokens cached: {cached_tokens}/{usage.get('prompt_tokens')}")
             
             return response_text
-            
+
+        except asyncio.CancelledError:
+            # Interrupted by the user; stop generating the abandoned response
+            speculation.cancel()
+            raise
         except Exception as e:
             print(f"Error getting LLM response: {e}")
-            return "I'm having trouble processing your request right now. Could you try again?"
+            response_text = "I'm having trouble processing your request right now. Could you try again?"
+            if on_sentence:
+                await on_sentence(response_text)
+            return response_text
 
 class TextToSpeech:
     def __init__(self):
         """
-        Initialize the Text-to-Speech using Deepgram's API.
+        Initialize the Text-to-Speech using Deepgram's streaming API.
+        A single WebSocket is kept open for the whole session so each
+        utterance skips the connection handshake.
         """
         self.dg_api_key = os.getenv("DG_API_KEY")
         if not self.dg_api_key:
@@ -143,6 +529,25 @@ class TextToSpeech:
             
         # Updated to use the current voice model (aura-zeus-en)
         self.model_name = "aura-zeus-en"  # Updated Deepgram TTS voice model
+        self.sample_rate = 24000
+        self.deepgram_url = (
+            f"wss://api.deepgram.com/v1/speak?model={self.model_name}"
+            f"&encoding=linear16&sample_rate={self.sample_rate}"
+        )
+
+        # Session-wide TTS socket, opened on first use and reopened if closed
+        self._socket = None
+
+        # Player process shared by the sentences of the response being spoken
+        self._player = None
+
+        # Set by interrupt() when the user talks over the current response
+        self._barge_in_event = asyncio.Event()
+
+        # Room echo can trail the end of playback, so is_speaking stays
+        # true for a moment after the player exits
+        self.echo_tail_seconds = 0.5
+        self._playback_ended_at = 0.0
     
     @staticmethod
     def is_installed(lib_name: str) -> bool:
@@ -150,9 +555,63 @@ class TextToSpeech:
         lib = shutil.which(lib_name)
         return lib is not None
 
-    def speak(self, text):
+    async def _connect(self):
+        """Return the open TTS WebSocket, reconnecting if it has been closed."""
+        if self._socket is None or self._socket.closed:
+            self._socket = await websockets.connect(
+                self.deepgram_url,
+                extra_headers={"Authorization": f"Token {self.dg_api_key}"},
+            )
+        return self._socket
+
+    async def _send_speak(self, text):
+        """Queue text on the TTS socket, retrying once on a dropped connection."""
+        messages = [
+            json.dumps({"type": "Speak", "text": text}),
+            json.dumps({"type": "Flush"}),
+        ]
+        for attempt in range(2):
+            socket = await self._connect()
+            try:
+                for message in messages:
+                    await socket.send(message)
+                return socket
+            except websockets.exceptions.ConnectionClosed:
+                self._socket = None
+                if attempt:
+                    raise
+
+    def _discard_socket(self):
+        """Drop the TTS socket, e.g. when audio still queued on it is no longer wanted."""
+        socket, self._socket = self._socket, None
+        if socket is not None:
+            asyncio.create_task(socket.close())
+
+    async def _start_player(self):
+        """Start the ffplay process that raw PCM audio is streamed into."""
+        player_command = [
+            "ffplay", "-autoexit", "-nodisp",
+            "-f", "s16le", "-ar", str(self.sample_rate),
+            "-i", "pipe:0",
+        ]
+        try:
+            return await asyncio.create_subprocess_exec(
+                *player_command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            print("Error: Could not start ffplay. Make sure FFmpeg is installed correctly.")
+            return None
+
+    async def speak_stream(self, text):
         """
-        Convert text to speech and play it through the speakers.
+        Convert a piece of a response to speech and queue it for playback.
+
+        Consecutive calls share a single player process, so sentences from
+        one LLM response play back-to-back. Await ``finish_stream`` once the
+        response is complete to wait for playback to end.
         
         Args:
             text: The text to convert to speech
@@ -163,61 +622,100 @@ class TextToSpeech:
         if not self.is_installed("ffplay"):
             print("Warning: ffplay not found. Please install FFmpeg to hear audio output.")
             return
-            
-        # Prepare API request - Updated URL parameters
-        deepgram_url = f"https://api.deepgram.com/v1/speak?model={self.model_name}"
-        headers = {
-            "Authorization": f"Token {self.dg_api_key}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "text": text
-        }
-
-        # Start ffplay process for streaming audio
-        player_command = ["ffplay", "-autoexit", "-", "-nodisp"]
-        try:
-            player_process = subprocess.Popen(
-                player_command,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
-        except FileNotFoundError:
-            print("Error: Could not start ffplay. Make sure FFmpeg is installed correctly.")
+
+        # Start ffplay process for streaming audio on the first chunk
+        if self._player is None:
+            self._barge_in_event.clear()
+            self._player = await self._start_player()
+            if self._player is None:
+                return
+        elif self._barge_in_event.is_set():
+            # The user interrupted this response; skip the rest of it
             return
+        player_process = self._player
 
         # Timing metrics
         start_time = time.time()
         first_byte_time = None
 
         try:
-            # Stream audio data to ffplay
-            with requests.post(deepgram_url, stream=True, headers=headers, json=payload) as r:
-                if r.status_code != 200:
-                    print(f"TTS API error: {r.status_code} - {r.text}")
-                    player_process.terminate()
+            socket = await self._send_speak(text)
+
+            # Stream audio frames to ffplay until Deepgram confirms the flush
+            async for message in socket:
+                if self._barge_in_event.is_set():
+                    # Audio still queued on the socket belongs to the interrupted response
+                    self._discard_socket()
                     return
-                
-                for chunk in r.iter_content(chunk_size=1024):
-                    if chunk:
-                        if first_byte_time is None:
-                            first_byte_time = time.time()
-                            ttfb = int((first_byte_time - start_time)*1000)
-                            print(f"TTS Time to First Byte (TTFB): {ttfb}ms\n")
-                        player_process.stdin.write(chunk)
-                        player_process.stdin.flush()
-
-            # Clean up
-            if player_process.stdin:
-                player_process.stdin.close()
-            player_process.wait()
+
+                if isinstance(message, bytes):
+                    if first_byte_time is None:
+                        first_byte_time = time.time()
+                        ttfb = int((first_byte_time - start_time)*1000)
+                        print(f"TTS Time to First Byte (TTFB): {ttfb}ms\n")
+                    # Wait for the pipe to drain instead of blocking the event loop
+                    player_process.stdin.write(message)
+                    await player_process.stdin.drain()
+                    continue
+
+                event = json.loads(message)
+                if event.get("type") == "Flushed":
+                    break
+                if event.get("type") in ("Warning", "Error"):
+                    print(f"TTS API {event['type'].lower()}: {event}")
             
-        except requests.exceptions.RequestException as e:
-            print(f"Error with TTS request: {e}")
+        except asyncio.CancelledError:
+            self._discard_socket()
+            raise
+        except (websockets.exceptions.WebSocketException, OSError) as e:
+            if not self._barge_in_event.is_set():
+                print(f"Error with TTS request: {e}")
+            self._socket = None
+
+    @property
+    def is_speaking(self):
+        """Whether a response is playing, or has only just stopped playing."""
+        if self._player is not None:
+            return True
+        return time.monotonic() - self._playback_ended_at < self.echo_tail_seconds
+
+    def interrupt(self):
+        """Stop playback of the current response right away."""
+        self._barge_in_event.set()
+        player_process = self._player
+        if player_process is not None and player_process.returncode is None:
+            player_process.terminate()
+
+    async def finish_stream(self):
+        """Close the current player input and wait for playback to finish."""
+        player_process = self._player
+        self._player = None
+        if player_process is None:
+            return
+
+        # Clean up
+        try:
             if player_process.stdin:
                 player_process.stdin.close()
-            player_process.terminate()
+            await player_process.wait()
+        finally:
+            self._playback_ended_at = time.monotonic()
+
+    async def speak(self, text):
+        """
+        Convert text to speech and play it through the speakers.
+        
+        Args:
+            text: The text to convert to speech
+        """
+        await self.speak_stream(text)
+        await self.finish_stream()
+
+    async def close(self):
+        """Close the session's TTS socket."""
+        if self._socket is not None:
+            await self._socket.close()
+            self._socket = None
 
 class SpeechRecognizer:
     def __init__(self):
@@ -229,115 +727,366 @@ class SpeechRecognizer:
             raise ValueError("DG_API_KEY environment variable not found. Please set it in your .env file.")
             
         self.transcript_collector = TranscriptCollector()
-        
-    async def listen_for_speech(self, callback):
-        transcription_complete = asyncio.get_event_loop().create_future()
 
+        # Session-wide Deepgram connection and the microphone feeding it
+        self._dg_connection = None
+        self._microphone = None
+
+    async def _open_ws(self):
+        """Open and start the Deepgram live connection used by ``start``."""
+        config = DeepgramClientOptions(options={"keepalive": "true"})
+        deepgram = DeepgramClient(self.api_key, config)
+        dg_connection = deepgram.listen.asyncwebsocket.v("1")
+
+        # Short endpointing finalizes segments quickly (each one feeds a
+        # speculative LLM run); the utterance itself ends on UtteranceEnd.
+        # smart_format is off as its post-processing delays finalization.
+        options = LiveOptions(
+            model="nova-2",
+            punctuate=True,
+            language="en-US",
+            encoding="linear16",
+            channels=1,
+            sample_rate=16000,
+            endpointing=200,
+            interim_results=True,
+            utterance_end_ms="1000",
+            vad_events=True,
+            smart_format=False,
+        )
+
+        if await dg_connection.start(options) is False:
+            raise ConnectionError("Failed to connect to Deepgram")
+        self._dg_connection = dg_connection
+        return dg_connection
+        
+    async def warm(self):
+        """Pre-open the Deepgram connection used by ``start``."""
         try:
-            config = DeepgramClientOptions(options={"keepalive": "true"})
-            deepgram = DeepgramClient(self.api_key, config)
-            dg_connection = deepgram.listen.websocket.v("1")
-            print("Listening...")
+            await self._open_ws()
+        except Exception as e:
+            print(f"Could not pre-open speech recognition connection: {e}")
 
-            async def on_message(self, result, **kwargs):
-                if not hasattr(result, 'channel') or not hasattr(result.channel, 'alternatives') or len(result.channel.alternatives) == 0:
-                    return
+    async def start(self, callback, on_interim=None, on_speech=None, ignore_while=None):
+        """
+        Start listening to the microphone for the rest of the session.
 
-                sentence = result.channel.alternatives[0].transcript
+        One Deepgram connection and microphone stream stay open across
+        turns, so speech is heard even while the assistant is talking.
 
-                if not result.speech_final:
-                    self.transcript_collector.add_part(sentence)
-                else:
-                    self.transcript_collector.add_part(sentence)
-                    full_sentence = self.transcript_collector.get_full_transcript()
-
-                    if full_sentence.strip():
-                        print(f"Human: {full_sentence}")
-                        callback(full_sentence)
-                        self.transcript_collector.reset()
-                        if not transcription_complete.done():
-                            transcription_complete.set_result(True)
-
-            dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
-
-            options = LiveOptions(
-                model="nova-2",
-                punctuate=True,
-                language="en-US",
-                encoding="linear16",
-                channels=1,
-                sample_rate=16000,
-                endpointing=300,
-                smart_format=True,
-            )
+        Args:
+            callback: Called with the full transcript each time an utterance ends
+            on_interim: Optional callable invoked with the transcript so far
+                each time Deepgram finalizes a segment before the utterance ends
+            on_speech: Optional callable invoked as soon as the user is heard
+                saying something, used to interrupt the assistant
+            ignore_while: Optional callable; transcripts arriving while it
+                returns True are dropped, so the assistant's own voice
+                picked up by the microphone is not taken as user speech
+        """
+        # Use the pre-opened connection if there is one
+        dg_connection = self._dg_connection or await self._open_ws()
+        self._dg_connection = dg_connection
 
-            await dg_connection.start(options)
+        async def on_message(_connection, result, **kwargs):
+            if not hasattr(result, 'channel') or not hasattr(result.channel, 'alternatives') or len(result.channel.alternatives) == 0:
+                return
 
-            microphone = Microphone(dg_connection.send)
-            microphone.start()
+            sentence = result.channel.alternatives[0].transcript
 
-            transcription_complete.set() 
-            await transcription_complete.wait()
+            # Drop what was heard along with any partial utterance it belongs to
+            if ignore_while and ignore_while():
+                self.transcript_collector.reset()
+                return
 
-            microphone.finish()
-            await dg_connection.finish()
+            # Ignore noise and one-word backchannels when deciding to barge in
+            if on_speech and len(sentence.strip()) > 3:
+                on_speech(sentence)
 
-        except Exception as e:
-            print(f"Error in speech recognition: {e}")
-            if not transcription_complete.done():
-                transcription_complete.set_result(True)
+            # Interim results are superseded by the final result for the same audio
+            if not result.is_final:
+                return
+
+            self.transcript_collector.add_part(sentence)
+            full_sentence = self.transcript_collector.get_full_transcript()
+
+            # Let the LLM start on what has been said so far
+            if on_interim and full_sentence.strip():
+                on_interim(full_sentence)
+
+        async def on_utterance_end(_connection, utterance_end, **kwargs):
+            # Segments finalized just before playback started would otherwise
+            # be sent on as a truncated utterance
+            if ignore_while and ignore_while():
+                self.transcript_collector.reset()
+                return
+
+            full_sentence = self.transcript_collector.get_full_transcript()
+
+            if full_sentence.strip():
+                print(f"Human: {full_sentence}")
+                callback(full_sentence)
+                self.transcript_collector.reset()
+
+        dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
+        dg_connection.on(LiveTranscriptionEvents.UtteranceEnd, on_utterance_end)
+
+        self._microphone = Microphone(dg_connection.send)
+        self._microphone.start()
+        print("Listening...")
+
+    async def stop(self):
+        """Stop the microphone and close the Deepgram connection."""
+        if self._microphone is not None:
+            self._microphone.finish()
+            self._microphone = None
+        if self._dg_connection is not None:
+            await self._dg_connection.finish()
+            self._dg_connection = None
+
+class LocalSpeechRecognizer:
+    def __init__(self):
+        """
+        Initialize on-device Speech-to-Text with faster-whisper.
+
+        The microphone is read with sounddevice, utterances are endpointed
+        with webrtcvad, and each utterance is transcribed locally by an int8
+        quantized Whisper model, so recognition has no network round-trip.
+        Interim transcripts are not produced, so speculative LLM starts are
+        not available with this backend.
+        """
+        if WhisperModel is None:
+            raise ValueError("STT_BACKEND=local requires faster-whisper, sounddevice and webrtcvad to be installed.")
+
+        self.sample_rate = 16000
+        self.frame_samples = self.sample_rate * 30 // 1000  # webrtcvad takes 10/20/30 ms frames
+        self.end_silence_frames = 700 // 30  # silence that ends an utterance
+        self.speech_frames = 300 // 30  # voiced audio that counts as barge-in
+
+        self.model = WhisperModel(
+            os.getenv("WHISPER_MODEL", "small.en"),
+            device=os.getenv("WHISPER_DEVICE", "cpu"),
+            compute_type=os.getenv("WHISPER_COMPUTE_TYPE", "int8"),
+            cpu_threads=4,
+        )
+        self.vad = webrtcvad.Vad(2)
+
+        self._stream = None
+        self._task = None
+
+    def _transcribe(self, pcm):
+        """Transcribe 16-bit mono PCM bytes and return the text."""
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(audio, beam_size=1, language="en", vad_filter=True)
+        return " ".join(segment.text.strip() for segment in segments).strip()
+
+    async def warm(self):
+        """Run a short silent clip through the model so the first turn doesn't pay its setup."""
+        await asyncio.to_thread(self._transcribe, bytes(self.frame_samples * 2))
+
+    async def start(self, callback, on_interim=None, on_speech=None, ignore_while=None):
+        """
+        Start listening to the microphone for the rest of the session.
+
+        Args:
+            callback: Called with the full transcript each time an utterance ends
+            on_interim: Accepted for compatibility with SpeechRecognizer; unused
+            on_speech: Optional callable invoked once the user has been
+                speaking for a moment, used to interrupt the assistant
+            ignore_while: Optional callable; audio captured while it returns
+                True is discarded, so the assistant is not transcribed
+        """
+        loop = asyncio.get_running_loop()
+        frames = asyncio.Queue()
+
+        def on_audio(indata, frame_count, time_info, status):
+            loop.call_soon_threadsafe(frames.put_nowait, bytes(indata))
+
+        self._stream = sounddevice.RawInputStream(
+            samplerate=self.sample_rate,
+            blocksize=self.frame_samples,
+            channels=1,
+            dtype="int16",
+            callback=on_audio,
+        )
+        self._stream.start()
+        self._task = asyncio.create_task(self._listen(frames, callback, on_speech, ignore_while))
+        print("Listening...")
+
+    async def _listen(self, frames, callback, on_speech, ignore_while):
+        """Endpoint microphone frames into utterances and transcribe each one."""
+        utterance = bytearray()
+        voiced_frames = 0
+        silent_frames = 0
+
+        while True:
+            frame = await frames.get()
+            if len(frame) != self.frame_samples * 2:
+                continue
+            if ignore_while and ignore_while():
+                utterance.clear()
+                voiced_frames = 0
+                silent_frames = 0
+                continue
+            if self.vad.is_speech(frame, self.sample_rate):
+                utterance += frame
+                voiced_frames += 1
+                silent_frames = 0
+                if on_speech and voiced_frames == self.speech_frames:
+                    on_speech("")
+                continue
+
+            if not voiced_frames:
+                continue
+
+            utterance += frame
+            silent_frames += 1
+            if silent_frames < self.end_silence_frames:
+                continue
+
+            start_time = time.time()
+            full_sentence = await asyncio.to_thread(self._transcribe, bytes(utterance))
+            utterance.clear()
+            voiced_frames = 0
+            silent_frames = 0
+
+            if full_sentence:
+                elapsed_time = int((time.time() - start_time) * 1000)
+                print(f"Human ({elapsed_time}ms): {full_sentence}")
+                callback(full_sentence)
+
+    async def stop(self):
+        """Stop the microphone and the endpointing task."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
 
 class ConversationManager:
     def __init__(self):
         """Initialize the conversation manager with all components."""
         self.llm = LanguageModelProcessor()
         self.tts = TextToSpeech()
-        self.speech_recognizer = SpeechRecognizer()
-        self.transcription_response = ""
+        # Deepgram streaming STT by default, on-device Whisper with STT_BACKEND=local
+        if os.getenv("STT_BACKEND") == "local":
+            self.speech_recognizer = LocalSpeechRecognizer()
+        else:
+            self.speech_recognizer = SpeechRecognizer()
+        self.utterances = None
+        self.speculation = None
+        self._response_task = None
         self.is_running = True
 
+        # Without echo cancellation the microphone hears the assistant, so
+        # talking over responses is opt-in (BARGE_IN=1, e.g. with a headset)
+        self.barge_in = os.getenv("BARGE_IN", "").lower() in ("1", "true", "yes")
+
     def handle_full_sentence(self, full_sentence):
         """Handle a complete transcribed sentence."""
-        self.transcription_response = full_sentence
+        self.utterances.put_nowait(full_sentence)
+
+    def handle_interim_sentence(self, partial_sentence):
+        """Speculatively start the LLM on a transcript that is not final yet."""
+        if self.speculation is not None:
+            if self.speculation.matches(partial_sentence):
+                return
+            self.speculation.cancel()
+        self.speculation = self.llm.speculate(partial_sentence)
+
+    def handle_speech(self, partial_sentence):
+        """Stop the assistant as soon as the user talks over it."""
+        if self._response_task is not None and not self._response_task.done():
+            print("Barge-in: stopping the current response")
+            self.tts.interrupt()
+            self._response_task.cancel()
+
+    async def respond(self, text, speculation):
+        """Speak the LLM response to ``text``, sentence by sentence as it is produced."""
+        try:
+            await self.llm.process(
+                text,
+                on_sentence=self.tts.speak_stream,
+                speculation=speculation,
+            )
+        finally:
+            await self.tts.finish_stream()
 
     async def main(self):
         """Main conversation loop."""
+        self.utterances = asyncio.Queue()
+
         # Welcome message
         welcome_message = "Hello! I'm your cell phone provider's virtual assistant. How can I help you today?"
         print(f"Assistant: {welcome_message}")
-        self.tts.speak(welcome_message)
+
+        # Open the LLM and STT connections while the welcome message plays,
+        # so the first turn doesn't pay their handshakes
+        await asyncio.gather(
+            self.tts.speak(welcome_message),
+            self.llm.warm(),
+            self.speech_recognizer.warm(),
+        )
+
+        # Listen continuously. With barge-in the microphone stays live while
+        # responses play so the user can interrupt them; otherwise anything
+        # heard during playback is the assistant itself and is dropped
+        if self.barge_in:
+            await self.speech_recognizer.start(
+                self.handle_full_sentence,
+                on_interim=self.handle_interim_sentence,
+                on_speech=self.handle_speech,
+            )
+        else:
+            await self.speech_recognizer.start(
+                self.handle_full_sentence,
+                on_interim=self.handle_interim_sentence,
+                ignore_while=lambda: self.tts.is_speaking,
+            )
         
         # Main conversation loop
-        while self.is_running:
-            try:
-                # Reset the transcription response
-                self.transcription_response = ""
-                
-                # Listen for speech
-                await self.speech_recognizer.listen_for_speech(self.handle_full_sentence)
-                
-                # Check for exit commands
-                if self.transcription_response.lower() in ["goodbye", "exit", "quit", "bye"]:
-                    farewell = "Thank you for contacting customer service. Have a great day!"
-                    print(f"Assistant: {farewell}")
-                    self.tts.speak(farewell)
+        try:
+            while self.is_running:
+                try:
+                    # Wait for the next complete utterance
+                    transcription_response = await self.utterances.get()
+                    speculation, self.speculation = self.speculation, None
+
+                    # A new utterance supersedes a response still being spoken
+                    if self._response_task is not None and not self._response_task.done():
+                        self.tts.interrupt()
+                        self._response_task.cancel()
+                        await asyncio.gather(self._response_task, return_exceptions=True)
+                    
+                    # Check for exit commands
+                    if transcription_response.lower().strip(" .!?") in ["goodbye", "exit", "quit", "bye"]:
+                        if speculation is not None:
+                            speculation.cancel()
+                        farewell = "Thank you for contacting customer service. Have a great day!"
+                        print(f"Assistant: {farewell}")
+                        await self.tts.speak(farewell)
+                        self.is_running = False
+                        break
+                    
+                    # Process the transcription through the LLM in the background
+                    # so the next utterance can interrupt it
+                    self._response_task = asyncio.create_task(
+                        self.respond(transcription_response, speculation)
+                    )
+                    
+                except KeyboardInterrupt:
+                    print("\nStopping the conversation...")
                     self.is_running = False
                     break
-                
-                # Process the transcription through the LLM
-                if self.transcription_response:
-                    llm_response = self.llm.process(self.transcription_response)
-                    
-                    # Speak the response
-                    self.tts.speak(llm_response)
-                
-            except KeyboardInterrupt:
-                print("\nStopping the conversation...")
-                self.is_running = False
-                break
-            except Exception as e:
-                print(f"Error in conversation loop: {e}")
-                # Continue the loop to keep the conversation going despite errors
+                except Exception as e:
+                    print(f"Error in conversation loop: {e}")
+                    # Continue the loop to keep the conversation going despite errors
+        finally:
+            # Release the session's STT and TTS connections
+            await self.speech_recognizer.stop()
+            await self.tts.close()
 
 
 if __name__ == "__main__":
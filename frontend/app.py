@@ -1,20 +1,39 @@
 import os
+import re
+import asyncio
+import time
 import uuid
-import json
-from fastapi import FastAPI, UploadFile, File, HTTPException
+import orjson
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from deepgram import DeepgramClient, PrerecordedOptions, SpeakOptions
-from groq import Groq
+from deepgram import DeepgramClient, PrerecordedOptions, SpeakOptions, LiveOptions, LiveTranscriptionEvents
+from groq import AsyncGroq
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app):
+    """Run the transcription batcher and speech cleanup for the app's lifetime"""
+    global transcription_queue
+    transcription_queue = asyncio.Queue()
+    background_tasks = [
+        asyncio.create_task(batch_worker()),
+        asyncio.create_task(speech_gc_loop()),
+    ]
+    try:
+        yield
+    finally:
+        for task in [*background_tasks, *batch_tasks]:
+            task.cancel()
+        await asyncio.gather(*background_tasks, *batch_tasks, return_exceptions=True)
+
 # Initialize FastAPI app
-app = FastAPI(title="AI Voice Assistant API")
+app = FastAPI(title="AI Voice Assistant API", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -34,11 +53,22 @@ if not DG_API_KEY or not GROQ_API_KEY:
 
 # Initialize clients
 deepgram = DeepgramClient(DG_API_KEY)
-groq_client = Groq(api_key=GROQ_API_KEY)
+groq_client = AsyncGroq(api_key=GROQ_API_KEY)
+
+# Concurrent transcriptions arriving within BATCH_WINDOW_SECONDS of each
+# other are collected into one batch, bucketed by clip length
+BATCH_MAX_SIZE = 8
+BATCH_WINDOW_SECONDS = 0.04
+BATCH_BUCKET_BYTES = 5 * 16000 * 2  # ~5 s of 16 kHz 16-bit mono audio
+transcription_queue = None
+batch_tasks = set()  # in-flight batches, referenced so they aren't garbage collected
 
-# Create static folder for audio responses
-os.makedirs("static/audio", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Text awaiting synthesis, keyed by speech id. Audio is streamed straight
+# from Deepgram when the client fetches /speech/{speech_id}.
+# Entries the client never fetched are dropped after SPEECH_TTL_SECONDS.
+SPEECH_TTL_SECONDS = 5 * 60
+SPEECH_GC_INTERVAL_SECONDS = 60
+pending_speech = {}
 
 # System prompt for customer service
 system_prompt = """
@@ -60,58 +90,213 @@ text_options = PrerecordedOptions(
     smart_format=True,
 )
 
+live_options = LiveOptions(
+    model="nova-2",
+    language="en",
+    smart_format=True,
+    interim_results=True,
+    utterance_end_ms="1000",
+)
+
 speak_options = SpeakOptions(
     model="aura-asteria-en",
     encoding="linear16",
     container="wav"
 )
 
+# Splits streamed LLM output after sentence-ending punctuation
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
 class TranscriptionResponse(BaseModel):
     text: str
 
-async def transcribe_audio(audio_file_path):
-    """Transcribe audio using Deepgram"""
-    with open(audio_file_path, "rb") as audio:
-        source = {"buffer": audio, "mimetype": "audio/wav"}
-        response = deepgram.listen.rest.v("1").transcribe_file(source, text_options)
-        transcript = json.loads(response.to_json())
-        
-        if "results" in transcript and "channels" in transcript["results"]:
-            transcription = transcript["results"]["channels"][0]["alternatives"][0]["transcript"]
-            return transcription
+async def transcribe_clip(audio_data):
+    """Transcribe a single in-memory clip using Deepgram"""
+    source = {"buffer": audio_data, "mimetype": "audio/wav"}
+    # The SDK call blocks on HTTP, so keep it off the event loop
+    response = await asyncio.to_thread(deepgram.listen.rest.v("1").transcribe_file, source, text_options)
+    transcript = orjson.loads(response.to_json())
+    
+    if "results" in transcript and "channels" in transcript["results"]:
+        transcription = transcript["results"]["channels"][0]["alternatives"][0]["transcript"]
+        return transcription
+    else:
+        return ""
+
+async def transcribe_batch(bucket):
+    """Transcribe a bucket of similar-length clips and resolve their futures
+
+    Deepgram's REST API accepts one clip per request, so clips are sent
+    concurrently. A local batched model would pad the bucket to its longest
+    clip and transcribe it in a single call here.
+    """
+    bucket = [(audio_data, future) for audio_data, future in bucket if not future.done()]
+    results = await asyncio.gather(
+        *(transcribe_clip(audio_data) for audio_data, _ in bucket),
+        return_exceptions=True,
+    )
+    for (_, future), result in zip(bucket, results):
+        if future.done():
+            continue
+        if isinstance(result, Exception):
+            future.set_exception(result)
         else:
-            return ""
+            future.set_result(result)
 
-async def get_ai_response(transcript):
-    """Get response from Groq LLM"""
-    response = groq_client.chat.completions.create(
+async def batch_worker():
+    """Collect queued transcription requests into batches and dispatch them"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await transcription_queue.get()]
+        deadline = loop.time() + BATCH_WINDOW_SECONDS
+        while len(batch) < BATCH_MAX_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(transcription_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        buckets = {}
+        for audio_data, future in batch:
+            buckets.setdefault(len(audio_data) // BATCH_BUCKET_BYTES, []).append((audio_data, future))
+
+        # Dispatch without waiting so the next batch is collected while this
+        # one is in flight
+        for bucket in buckets.values():
+            task = asyncio.create_task(transcribe_batch(bucket))
+            batch_tasks.add(task)
+            task.add_done_callback(batch_tasks.discard)
+
+async def speech_gc_loop():
+    """Periodically drop registered speech that was never fetched"""
+    while True:
+        await asyncio.sleep(SPEECH_GC_INTERVAL_SECONDS)
+        cutoff = time.monotonic() - SPEECH_TTL_SECONDS
+        expired = [speech_id for speech_id, (_, created) in pending_speech.items() if created < cutoff]
+        for speech_id in expired:
+            pending_speech.pop(speech_id, None)
+
+async def transcribe_audio(audio_data):
+    """Transcribe in-memory audio using Deepgram, batched with concurrent requests"""
+    future = asyncio.get_running_loop().create_future()
+    await transcription_queue.put((audio_data, future))
+    return await future
+
+async def transcribe_stream(chunks):
+    """Transcribe audio with Deepgram live STT while its chunks are still arriving"""
+    finals = []
+    done = asyncio.Event()
+    dg_connection = deepgram.listen.asyncwebsocket.v("1")
+
+    async def on_transcript(_client, result, **kwargs):
+        if not result.is_final:
+            return
+        transcript = result.channel.alternatives[0].transcript
+        if transcript:
+            finals.append(transcript)
+        if getattr(result, "from_finalize", False):
+            done.set()
+
+    async def on_done(_client, *args, **kwargs):
+        done.set()
+
+    dg_connection.on(LiveTranscriptionEvents.Transcript, on_transcript)
+    dg_connection.on(LiveTranscriptionEvents.UtteranceEnd, on_done)
+    dg_connection.on(LiveTranscriptionEvents.Close, on_done)
+
+    if not await dg_connection.start(live_options):
+        raise RuntimeError("Failed to connect to Deepgram")
+    try:
+        async for chunk in chunks:
+            if chunk:
+                await dg_connection.send(chunk)
+
+        # Pauses mid-upload may already have ended an utterance; wait for the
+        # results of the audio still buffered on Deepgram's side
+        done.clear()
+        await dg_connection.finalize()
+        try:
+            await asyncio.wait_for(done.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            pass
+    finally:
+        await dg_connection.finish()
+
+    return " ".join(finals)
+
+async def stream_ai_response(transcript):
+    """Stream the response from Groq LLM, yielding text deltas as they arrive"""
+    stream = await groq_client.chat.completions.create(
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": transcript}
         ],
         model="deepseek-r1-distill-llama-70b",
-        temperature=0.7
+        temperature=0.7,
+        stream=True
     )
-    return response.choices[0].message.content
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
+
+async def split_sentences(deltas):
+    """Regroup streamed text deltas into complete sentences"""
+    buffer = ""
+    async for delta in deltas:
+        buffer += delta
+        sentences = SENTENCE_BOUNDARY.split(buffer)
+        buffer = sentences.pop()
+        for sentence in sentences:
+            yield sentence
+    if buffer.strip():
+        yield buffer
+
+async def get_ai_response(transcript):
+    """Get response from Groq LLM"""
+    return "".join([delta async for delta in stream_ai_response(transcript)])
 
 async def text_to_speech(text):
-    """Convert text to speech using Deepgram"""
+    """Register text for speech synthesis and return the URL its audio streams from"""
+    speech_id = str(uuid.uuid4())
+    pending_speech[speech_id] = (text, time.monotonic())
+    return f"/speech/{speech_id}"
+
+@app.get("/speech/{speech_id}")
+async def stream_speech(speech_id: str):
+    """Synthesize registered text with Deepgram and stream the audio back"""
+    # Left in place so the URL can be fetched again (range requests, replays);
+    # speech_gc_loop expires it
+    entry = pending_speech.get(speech_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown speech id")
+    text, _ = entry
+
+    # Forward Deepgram's response body chunk by chunk as it arrives instead
+    # of buffering the whole clip first
     text_payload = {"text": text}
-    filename = f"static/audio/response-{uuid.uuid4()}.wav"
-    response = deepgram.speak.rest.v("1").save(filename, text_payload, speak_options)
-    return filename
+    response = await deepgram.speak.asyncrest.v("1").stream_raw(text_payload, speak_options)
+    if response.status_code != 200:
+        await response.aclose()
+        raise HTTPException(status_code=502, detail="Speech synthesis failed")
+
+    async def audio_chunks():
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            await response.aclose()
+
+    return StreamingResponse(audio_chunks(), media_type="audio/wav")
 
 @app.post("/process-audio")
 async def process_audio(audio: UploadFile = File(...)):
     """Process audio, transcribe, get AI response, and convert to speech"""
     try:
-        # Save uploaded audio to temp file
-        audio_file_path = f"temp-audio-{uuid.uuid4()}.wav"
-        with open(audio_file_path, "wb") as buffer:
-            buffer.write(await audio.read())
-        
-        # Transcribe audio
-        transcript = await transcribe_audio(audio_file_path)
+        # Transcribe the uploaded audio straight from memory
+        transcript = await transcribe_audio(await audio.read())
         if not transcript:
             raise HTTPException(status_code=400, detail="Failed to transcribe audio")
         
@@ -119,22 +304,51 @@ async def process_audio(audio: UploadFile = File(...)):
         text_response = await get_ai_response(transcript)
         
         # Convert to speech
-        audio_file = await text_to_speech(text_response)
-        
-        # Clean up temp file
-        os.remove(audio_file_path)
+        audio_url = await text_to_speech(text_response)
         
         # Return response
-        return JSONResponse({
+        return {
             "transcript": transcript,
             "text_response": text_response,
-            "audio_url": f"/{audio_file}"
-        })
+            "audio_url": audio_url
+        }
     
     except Exception as e:
         print(f"Error processing audio: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def server_sent_event(event, data):
+    """Format a server-sent event carrying a JSON payload"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+@app.post("/process-audio/stream")
+async def process_audio_stream(request: Request):
+    """Process audio and stream the response back sentence by sentence as server-sent events
+
+    The audio is sent as the raw request body and transcribed while it is
+    still uploading.
+    """
+    transcript = await transcribe_stream(request.stream())
+    if not transcript:
+        raise HTTPException(status_code=400, detail="Failed to transcribe audio")
+
+    async def events():
+        yield server_sent_event("transcript", {"transcript": transcript})
+        try:
+            # Register each sentence for synthesis as soon as the LLM completes it
+            async for sentence in split_sentences(stream_ai_response(transcript)):
+                audio_url = await text_to_speech(sentence)
+                yield server_sent_event("sentence", {
+                    "text_response": sentence,
+                    "audio_url": audio_url
+                })
+        except Exception as e:
+            print(f"Error streaming response: {str(e)}")
+            yield server_sent_event("error", {"detail": str(e)})
+        yield server_sent_event("done", {})
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")